@@ -1,17 +1,23 @@
 import sys
-import requests
-import urllib3
 import argparse
-import configparser
 import logging
-import json
+import io
+import shutil
 
-# Suppress SSL warnings
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+# requests, urllib3 and configparser are imported where they are used, so that
+# --help and configuration errors do not pay for loading them
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
+# Text written before and after the file content of a tag
+BRACKETS = {
+    "SQUAREBRACKETS": ("\n[", "]\n"),
+    "CURLYBRACKETS": ("\n{", "}\n"),
+    "PARENTHESES": ("\n(", ")\n"),
+    "ANGLEBRACKETS": ("\n<", ">\n"),
+}
+
 def load_configuration(args):
     """
     Load configuration from a file and override with command-line arguments.
@@ -23,6 +29,8 @@ def load_configuration(args):
         dict: A dictionary containing the final configuration values.
         list: tag_file_tuples, a list of (tag, file_name) tuples from config or CLI.
     """
+    import configparser
+
     config = configparser.ConfigParser()
     tag_file_tuples = []
     if args.config:
@@ -37,15 +45,16 @@ def load_configuration(args):
     # Determine the section to read from
     section = args.section if args.section else "DEFAULT"
 
+    # Keys are looked up, and interpolated, one at a time when they are used.
+    # A missing section has no values, its keys are not taken from DEFAULT.
+    sect = config[section] if section in config else {}
+
     # Read tag_file_tuples only from keys named 'tag_file' that contain a comma
-    if section in config:
-        for key, value in config.items(section):
-            if key == "tag_file":
-                for line in value.splitlines():
-                    line = line.strip()
-                    if ',' in line:
-                        tag, file_name = line.split(',', 1)
-                        tag_file_tuples.append((tag.strip(), file_name.strip()))
+    for line in sect.get("tag_file", "").splitlines():
+        line = line.strip()
+        if ',' in line:
+            tag, file_name = line.split(',', 1)
+            tag_file_tuples.append((tag.strip(), file_name.strip()))
 
     # Add/override with positional arguments from CLI
     for tf in args.tag_file:
@@ -57,9 +66,9 @@ def load_configuration(args):
 
     # Load and override configuration
     return {
-        "prompt_path": args.prompt or config.get(section, "prompt", fallback=None),
-        "url": args.url or config.get(section, "url", fallback=None),
-        "bearer_token": args.bearer or config.get(section, "bearer", fallback=None),
+        "prompt_path": args.prompt or sect.get("prompt"),
+        "url": args.url or sect.get("url"),
+        "bearer_token": args.bearer or sect.get("bearer"),
     }, tag_file_tuples
 
 def validate_configuration(config, tag_file_tuples):
@@ -109,64 +118,127 @@ def build_payload_str(prompt, tag_file_tuples):
     Returns:
         str: The constructed payload string.
     """
-    payload_str = prompt
+    payload = io.StringIO()
+    payload.write(prompt)
     for tag, file_name in tag_file_tuples:
+        opening, closing = BRACKETS.get(tag, (f"\n{tag}\n", f"\n{tag}\n"))
+        mark = payload.tell()
         try:
+            # Stream the file into the payload instead of reading it whole first
             with open(file_name, 'r', errors='ignore') as text_file:
-                text = text_file.read()
+                payload.write(opening)
+                shutil.copyfileobj(text_file, payload)
         except FileNotFoundError:
             logging.error(f"File not found (skipped): {file_name}")
             continue  # Skip this file and continue with the next
         except Exception as e:
+            # Drop whatever part of the file was already copied
+            payload.seek(mark)
+            payload.truncate()
             logging.error(f"Error reading file '{file_name}' (skipped): {e}")
             continue  # Skip this file and continue with the next
-        if tag == "SQUAREBRACKETS":
-            payload_str += f"\n[{text}]\n"
-        elif tag == "CURLYBRACKETS":
-            payload_str += f"\n{{{text}}}\n"
-        elif tag == "PARENTHESES":
-            payload_str += f"\n({text})\n"
-        elif tag == "ANGLEBRACKETS":
-            payload_str += f"\n<{text}>\n"
-        else:
-            payload_str += f"\n{tag}\n{text}\n{tag}\n"
-    return payload_str
+        payload.write(closing)
+    return payload.getvalue()
+
+def suppress_ssl_warnings():
+    """
+    Suppress the warnings urllib3 emits for requests sent without certificate verification.
+    """
+    import urllib3
+
+    urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
-def post_text_to_url(prompt_path, url, headers, tag_file_tuples):
+def create_session(headers, pool_maxsize=16):
+    """
+    Create a session that keeps connections alive across POST requests.
+    Requests failing with a transient gateway error are retried with backoff.
+
+    Parameters:
+        headers (dict): Headers sent with every request of the session.
+        pool_maxsize (int): The number of connections kept open per host.
+
+    Returns:
+        requests.Session: The configured session.
+    """
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    session = requests.Session()
+    session.headers.update(headers)
+    session.verify = False
+    suppress_ssl_warnings()
+    # POST is not retried by default, allow it for the listed status codes. A read
+    # error is not retried, the server may already have processed the request.
+    retries = Retry(
+        total=3, read=False, backoff_factor=0.5, status_forcelist=[502, 503, 504], allowed_methods=None
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize, max_retries=retries)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+def post_text_to_url(prompt_path, url, headers, tag_file_tuples, session=None):
     """
     Reads a prompt from a file, appends text from tag/file tuples, and sends it as a POST request.
 
     Parameters:
-        prompt_path (str): The path to the file containing the prompt.
+        prompt_path (str): The path to the file containing the prompt, or "-" to read it from stdin as UTF-8.
         url (str): The URL to which the POST request will be sent.
         headers (dict): Headers for the POST request.
         tag_file_tuples (list): List of (tag, file_name) tuples.
+        session (requests.Session): Optional session to reuse connections from.
 
     Returns:
         str: The response text from the server.
     """
     try:
-        # Read the prompt from the prompt file
-        with open(prompt_path, 'r', errors='ignore') as prompt_file:
-            prompt = prompt_file.read()
+        # Read the prompt from stdin or the prompt file
+        if prompt_path == "-":
+            prompt = sys.stdin.buffer.read().decode('utf-8', errors='ignore')
+        else:
+            with open(prompt_path, 'r', errors='ignore') as prompt_file:
+                prompt = prompt_file.read()
+    except FileNotFoundError as e:
+        logging.error(f"File not found: {e}")
+        raise
+
+    return post_prompt_to_url(prompt, url, headers, tag_file_tuples, session=session)
 
+def post_prompt_to_url(prompt, url, headers, tag_file_tuples, session=None):
+    """
+    Appends text from tag/file tuples to an already loaded prompt and sends it as a POST request.
+
+    Parameters:
+        prompt (str): The prompt text.
+        url (str): The URL to which the POST request will be sent.
+        headers (dict): Headers for the POST request.
+        tag_file_tuples (list): List of (tag, file_name) tuples.
+        session (requests.Session): Optional session to reuse connections from.
+
+    Returns:
+        str: The response text from the server.
+    """
+    import requests
+
+    try:
         # Build the payload string using the new function
         payload_str = build_payload_str(prompt, tag_file_tuples)
-        payload_str = json.dumps(payload_str)
         payload = {"message": payload_str, "mode": "chat"}
-        logging.info(f"Payload: {payload}")
+        logging.debug("Payload: %s", payload)
 
         # Send the POST request, ignoring SSL certificate errors
-        response = requests.post(url, json=payload, headers=headers, verify=False)
+        if session is None:
+            suppress_ssl_warnings()
+            response = requests.post(url, json=payload, headers=headers, verify=False)
+        else:
+            response = session.post(url, json=payload, headers=headers)
 
         # Raise an exception for HTTP errors
         response.raise_for_status()
 
         # Return the response text
         return response.json().get("textResponse", "")
-    except FileNotFoundError as e:
-        logging.error(f"File not found: {e}")
-        raise
     except requests.exceptions.RequestException as e:
         logging.error(f"Request error: {e}")
         raise
@@ -175,6 +247,8 @@ def post_text_to_url(prompt_path, url, headers, tag_file_tuples):
         raise
 
 def run(args):
+    import requests
+
     # Load configuration and tag_file_tuples
     try:
         config, tag_file_tuples = load_configuration(args)
@@ -186,8 +260,9 @@ def run(args):
         headers = prepare_headers(config["bearer_token"])
 
         # Send POST request
+        session = create_session(headers, pool_maxsize=1)
         response_text = post_text_to_url(
-            config["prompt_path"], config["url"], headers, tag_file_tuples
+            config["prompt_path"], config["url"], headers, tag_file_tuples, session=session
         )
         # Log and print the response
         logging.info(f"Response: {response_text}")
@@ -205,18 +280,18 @@ def run(args):
         logging.error(f"Unexpected Error: {e}")
         sys.exit(1)
 
-def main():
+def main(argv=None):
     # Set up argument parsing
     parser = argparse.ArgumentParser(description="Send a POST request with text and prompt.")
-    parser.add_argument("-p", "--prompt", help="The path to the file containing the prompt.", required=False)
+    parser.add_argument("-p", "--prompt", help="The path to the file containing the prompt, '-' for stdin.", required=False)
     parser.add_argument("-u", "--url", help="The URL to which the POST request will be sent.", required=False)
     parser.add_argument("-b", "--bearer", help="The Bearer token for authorization.", required=False)
     parser.add_argument("-c", "--config", help="The path to the configuration file.", required=False)
     parser.add_argument("-n", "--section", help="The section name in the configuration file.", required=False)
     parser.add_argument("tag_file", nargs="*", help="Tuples in the format <tag>,<file_name>")
 
-    # Parse the arguments
-    args = parser.parse_args()
+    # Parse the arguments, from sys.argv unless argv is given
+    args = parser.parse_args(argv)
     run(args)
 
 if __name__ == "__main__":
@@ -1,13 +1,102 @@
 import os
-import glob
 import sys
 import argparse
-import configparser
 import logging
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import storyutil
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
+# Size of the chunks copied from a source file into the merged file
+COPY_BUFFER_SIZE = 1 << 20
+
+# Blank line written after each merged file, in the platform's line endings
+SEPARATOR = (os.linesep * 2).encode()
+
+def write_all(dst_file, data):
+    """
+    Write all of data to an unbuffered file, repeating the write after a short write.
+
+    Parameters:
+        dst_file (file): The destination file, opened in unbuffered binary mode.
+        data (bytes): The data to write.
+    """
+    data = memoryview(data)
+    while data:
+        data = data[dst_file.write(data):]
+
+def copy_file(src_file, dst_file):
+    """
+    Copy the content of src_file to the current position of dst_file without decoding it.
+    os.sendfile copies inside the kernel where it is available, otherwise the content
+    is copied in COPY_BUFFER_SIZE chunks.
+
+    Parameters:
+        src_file (file): The source file, opened in binary mode.
+        dst_file (file): The destination file, opened in unbuffered binary mode.
+    """
+    if hasattr(os, "sendfile"):
+        size = os.fstat(src_file.fileno()).st_size
+        offset = 0
+        try:
+            while offset < size:
+                sent = os.sendfile(dst_file.fileno(), src_file.fileno(), offset, size - offset)
+                if sent == 0:
+                    break
+                offset += sent
+            return
+        except OSError:
+            # Not supported for these files, copy the rest in user space
+            src_file.seek(offset)
+    while True:
+        chunk = src_file.read(COPY_BUFFER_SIZE)
+        if not chunk:
+            break
+        write_all(dst_file, chunk)
+
+def _merge_group(output_file_path, file_paths):
+    """
+    Append the content of each source file, in order, to one merged file.
+
+    Parameters:
+        output_file_path (str): The merged file the sources are appended to.
+        file_paths (list): The source files merged into output_file_path.
+    """
+    # Open the destination once for the whole group and write at its end. O_APPEND is
+    # not used since os.sendfile refuses to write to such files.
+    flags = os.O_WRONLY | os.O_CREAT | getattr(os, "O_BINARY", 0)
+    try:
+        dst_file = open(output_file_path, 'wb', buffering=0, opener=lambda path, _: os.open(path, flags, 0o666))
+    except Exception as e:
+        logging.error(f"Error writing to file {output_file_path}: {e}")
+        return
+
+    with dst_file:
+        try:
+            dst_file.seek(0, os.SEEK_END)
+        except Exception as e:
+            logging.error(f"Error writing to file {output_file_path}: {e}")
+            return
+
+        for file_path in file_paths:
+            # Open the source file
+            try:
+                src_file = open(file_path, 'rb')
+            except FileNotFoundError as e:
+                logging.error(f"File not found: {file_path}. Error: {e}")
+                continue
+
+            # Copy the content to the destination file
+            with src_file:
+                try:
+                    copy_file(src_file, dst_file)
+                    write_all(dst_file, SEPARATOR)
+                    logging.info(f"Merged: {file_path} -> {output_file_path}")
+                except Exception as e:
+                    logging.error(f"Error writing to file {output_file_path}: {e}")
+
 def merge_files(SRC_PATH, DST_PATH, PATTERN, FIND_STR, REPLACE_STR):
     """
     Reads files from SRC_PATH matching the PATTERN and writes their content into a file in DST_PATH
@@ -23,36 +112,36 @@ def merge_files(SRC_PATH, DST_PATH, PATTERN, FIND_STR, REPLACE_STR):
     # Ensure the destination directory exists
     os.makedirs(DST_PATH, exist_ok=True)
 
-    # Find all files matching the pattern
-    pattern = os.path.join(SRC_PATH, PATTERN)
-    for file_path in glob.glob(pattern):
+    # Single character replacements are done with a translation table
+    table = str.maketrans(FIND_STR, REPLACE_STR) if len(FIND_STR) == 1 == len(REPLACE_STR) else None
+
+    # Destination directory with a trailing separator, output names are appended to it
+    dst_prefix = os.path.join(DST_PATH, "")
+
+    # Group the files by the merged file they are appended to
+    groups = defaultdict(list)
+    for file_path in storyutil.match_files(SRC_PATH, PATTERN):
         file_name = os.path.basename(file_path)
-        base_name = os.path.splitext(file_name)[0]
+        base_name = file_name.rpartition('.')[0] or file_name
         
         # Remove the last part of the file name (separated by underscores)
-        new_base_name = "_".join(base_name.split("_")[:-1])
+        new_base_name = base_name.rpartition("_")[0]
 
         # Replace FIND_STR with REPLACE_STR in the base name
-        new_base_name = new_base_name.replace(FIND_STR, REPLACE_STR)
+        new_base_name = new_base_name.translate(table) if table else new_base_name.replace(FIND_STR, REPLACE_STR)
 
         output_file_name = f"{new_base_name}.txt"
-        output_file_path = os.path.join(DST_PATH, output_file_name)
-        
-        # Read the content of the source file
-        try:
-            with open(file_path, 'r', encoding='utf-8') as src_file:
-                content = src_file.read()
-        except FileNotFoundError as e:
-            logging.error(f"File not found: {file_path}. Error: {e}")
-            continue
-        
-        # Write the content to the destination file
-        try:
-            with open(output_file_path, 'a', encoding='utf-8') as dst_file:
-                dst_file.write(content + "\n\n")
-            logging.info(f"Merged: {file_path} -> {output_file_path}")
-        except Exception as e:
-            logging.error(f"Error writing to file {output_file_path}: {e}")
+        output_file_path = dst_prefix + output_file_name
+        groups[output_file_path].append(file_path)
+
+    # Merge the groups in parallel, each group is appended by a single worker
+    with ThreadPoolExecutor() as executor:
+        futures = [
+            executor.submit(_merge_group, output_file_path, file_paths)
+            for output_file_path, file_paths in groups.items()
+        ]
+        for future in as_completed(futures):
+            future.result()
 
 def load_configuration(args):
     """
@@ -64,6 +153,8 @@ def load_configuration(args):
     Returns:
         dict: A dictionary containing the final configuration values.
     """
+    import configparser
+
     config = configparser.ConfigParser()
     if args.config:
         try:
@@ -77,13 +168,17 @@ def load_configuration(args):
     # Determine the section to read from
     section = args.section if args.section else "DEFAULT"
 
+    # Keys are looked up, and interpolated, one at a time when they are used.
+    # A missing section has no values, its keys are not taken from DEFAULT.
+    sect = config[section] if section in config else {}
+
     # Load and override configuration
     return {
-        "source": args.source or config.get(section, "source", fallback=None),
-        "destination": args.destination or config.get(section, "destination", fallback=None),
-        "pattern": args.pattern or config.get(section, "pattern", fallback=None),
-        "find": args.find or config.get(section, "find", fallback=None),
-        "replace": args.replace or config.get(section, "replace", fallback=None),
+        "source": args.source or sect.get("source"),
+        "destination": args.destination or sect.get("destination"),
+        "pattern": args.pattern or sect.get("pattern"),
+        "find": args.find or sect.get("find"),
+        "replace": args.replace or sect.get("replace"),
     }
 
 def validate_configuration(config):
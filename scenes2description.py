@@ -1,14 +1,28 @@
 import os
-import glob
 import sys
 import subprocess
 import argparse
 import configparser
 import logging
+import ewardea
+import storyutil
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
+# Default number of requests sent to the server at the same time
+MAX_WORKERS = 8
+
+# Validated configurations of earlier runs, keyed by arguments and config file mtime
+_CONFIG_CACHE = {}
+
+# Destination directories already created by earlier runs
+_CREATED_DIRS = set()
+
+# ewardea.py, run in a child process per file with --isolate
+EWARDEA_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ewardea.py")
+
 def load_configuration(args):
     """
     Load configuration from a file and override with command-line arguments.
@@ -20,10 +34,10 @@ def load_configuration(args):
         dict: A dictionary containing the final configuration values.
     """
     config = configparser.ConfigParser()
-    tag_file = ""
+    tag_file_tuples = []
     if args.config:
         try:
-            config.read(args.config)
+            config = storyutil.load_config_parser(args.config)
             if not config.sections() and not config.defaults():
                 raise ValueError(f"Configuration file '{args.config}' is empty or invalid.")
         except Exception as e:
@@ -33,25 +47,29 @@ def load_configuration(args):
     # Determine the section to read from
     section = args.section if args.section else "DEFAULT"
 
+    # Keys are looked up, and interpolated, one at a time when they are used.
+    # A missing section has no values, its keys are not taken from DEFAULT.
+    sect = config[section] if section in config else {}
+
     # Read tag_file_tuples only from keys named 'tag_file' that contain a comma
-    if section in config:
-        for key, value in config.items(section):
-            if key == "tag_file":
-                for line in value.splitlines():
-                    line = line.strip()
-                    if ',' in line:
-                        tag_file += f" {line}"
+    for line in sect.get("tag_file", "").splitlines():
+        line = line.strip()
+        if ',' in line:
+            tag, file_name = line.split(',', 1)
+            tag_file_tuples.append((tag.strip(), file_name.strip()))
 
     # Load and override configuration
     return {
-        "source": args.source or config.get(section, "source", fallback=None),
-        "destination": args.destination or config.get(section, "destination", fallback=None),
-        "pattern": args.pattern or config.get(section, "pattern", fallback=None),
-        "find": args.find or config.get(section, "find", fallback=None),
-        "replace": args.replace or config.get(section, "replace", fallback=None),
-        "url": args.url or config.get(section, "url", fallback=None),
-        "bearer_token": args.bearer or config.get(section, "bearer", fallback=None),
-        "tag_file": tag_file,
+        "source": args.source or sect.get("source"),
+        "destination": args.destination or sect.get("destination"),
+        "pattern": args.pattern or sect.get("pattern"),
+        "find": args.find or sect.get("find"),
+        "replace": args.replace or sect.get("replace"),
+        "url": args.url or sect.get("url"),
+        "bearer_token": args.bearer or sect.get("bearer"),
+        "tag_file_tuples": tag_file_tuples,
+        "isolate": args.isolate or config.getboolean(section, "isolate", fallback=False),
+        "workers": args.workers if args.workers is not None else config.getint(section, "workers", fallback=MAX_WORKERS),
     }
 
 def validate_configuration(config):
@@ -64,11 +82,131 @@ def validate_configuration(config):
     Raises:
         ValueError: If any required parameter is missing.
     """
-    required_keys = ["source", "destination", "pattern", "find", "replace"]
+    required_keys = ["source", "destination", "pattern", "find", "replace", "url", "bearer_token"]
     missing_keys = [key for key in required_keys if not config.get(key)]
     if missing_keys:
         logging.error(f"Missing required parameters: {', '.join(missing_keys)}")
         raise ValueError(f"Missing required parameters: {', '.join(missing_keys)}")
+    if config["workers"] < 1:
+        logging.error(f"The number of workers must be at least 1, got {config['workers']}")
+        raise ValueError(f"The number of workers must be at least 1, got {config['workers']}")
+
+def describe_file(prompt, url, headers, tag_file_tuples, output_file, session):
+    """
+    Send the prompt and tag/file tuples to the server and write the response to a file.
+
+    Parameters:
+        prompt (str): The prompt text.
+        url (str): The URL to which the POST request will be sent.
+        headers (dict): Headers for the POST request.
+        tag_file_tuples (list): List of (tag, file_name) tuples.
+        output_file (str): The path of the file the response is written to.
+        session (requests.Session): The session to send the request with.
+
+    Returns:
+        str: The path of the written output file.
+    """
+    response_text = ewardea.post_prompt_to_url(prompt, url, headers, tag_file_tuples, session=session)
+    # End the response with a newline, as ewardea.py prints it in --isolate mode
+    with open(output_file, "w", encoding="utf-8") as output:
+        output.write(response_text)
+        output.write("\n")
+    return output_file
+
+def iter_output_files(config, file_pattern):
+    """
+    Yield the files matching the pattern in the source directory with the path of their output file.
+
+    Parameters:
+        config (dict): Configuration dictionary.
+        file_pattern (str): The pattern to match files in the source directory.
+
+    Yields:
+        tuple: The path of the matched file and the path of its output file.
+    """
+    # Loop invariants, output names are appended to the destination prefix
+    dst_prefix = os.path.join(config["destination"], "")
+    find = config["find"]
+    replace = config["replace"]
+
+    for file_path in storyutil.match_files(config["source"], file_pattern):
+        name = os.path.basename(file_path)
+        file_name = name.rpartition('.')[0] or name
+        logging.info(f"Processing file: {file_name}")
+
+        # Replace FIND_STR with REPLACE_STR in the output file name
+        output_file = f"{dst_prefix}{file_name.replace(find, replace)}.txt"
+        yield file_path, output_file
+
+def run_isolated(command, output_file, input_bytes):
+    """
+    Run a command and redirect its output to the output file.
+
+    Parameters:
+        command (list): The command to execute.
+        output_file (str): The path of the file the output is written to.
+        input_bytes (bytes): The data sent to the standard input of the command.
+
+    Returns:
+        str: The path of the written output file.
+    """
+    logging.info(f"Command to execute: {command}")
+    # The child writes straight to the file descriptor, so no text layer is needed
+    with open(output_file, "wb") as output:
+        subprocess.run(command, input=input_bytes, stdout=output, stderr=subprocess.PIPE, check=True)
+    return output_file
+
+def process_files_isolated(config, args, tag, file_pattern, prompt):
+    """
+    Process files by running ewardea.py in a separate process for each file,
+    so that a crash only loses the file being processed. Up to config["workers"]
+    processes run at the same time.
+
+    Parameters:
+        config (dict): Configuration dictionary.
+        args (Namespace): Parsed command-line arguments.
+        tag (str): The tag of the matched files.
+        file_pattern (str): The pattern to match files in the source directory.
+        prompt (str): The prompt text.
+    """
+    # The prompt is piped to every child instead of each one reading the prompt file
+    prompt_bytes = prompt.encode('utf-8')
+
+    # Construct the part of the command shared by all files
+    base_command = [
+        sys.executable,
+        EWARDEA_SCRIPT,
+        "-p", "-"  # Add the -p switch to read the prompt from stdin
+    ]
+
+    # Include optional parameters in the command, ewardea.py reads the
+    # tag_file entries of the section itself
+    if args.url:
+        base_command.extend(["-u", args.url])
+    if args.bearer:
+        base_command.extend(["-b", args.bearer])
+    if args.config:
+        base_command.extend(["-c", args.config])
+    if args.section:
+        base_command.extend(["-n", args.section])
+
+    with ThreadPoolExecutor(max_workers=config["workers"]) as executor:
+        futures = {}
+        for file_path, output_file in iter_output_files(config, file_pattern):
+            # Add the positional argument: <tag>,<file_name>
+            command = base_command + [f"{tag},{file_path}"]
+
+            futures[executor.submit(run_isolated, command, output_file, prompt_bytes)] = file_path
+
+        # Report each file as soon as its process has finished
+        for future in as_completed(futures):
+            try:
+                output_file = future.result()
+                logging.info(f"Output written to: {output_file}")
+            except subprocess.CalledProcessError as e:
+                logging.error(f"Error processing {futures[future]}: {e.stderr.decode().strip()}")
+            except Exception as e:
+                logging.error(f"Error processing {futures[future]}: {e}")
 
 def process_files(config, args):
     """
@@ -86,62 +224,76 @@ def process_files(config, args):
     tag = tag.strip()
     file_pattern = file_pattern.strip()
 
-    # Define the prompt file
+    # Define the prompt file and read it once for all files
     prompt_file = os.path.join(config["source"], f"{config['replace']}prompt.txt")
+    with open(prompt_file, 'r', errors='ignore') as prompt_text:
+        prompt = prompt_text.read()
 
-    # Ensure the destination directory exists
-    os.makedirs(config["destination"], exist_ok=True)
+    # Ensure the destination directory exists, once per destination
+    if config["destination"] not in _CREATED_DIRS:
+        os.makedirs(config["destination"], exist_ok=True)
+        _CREATED_DIRS.add(config["destination"])
 
-    # Iterate over all files matching the pattern in the source directory
-    pattern = os.path.join(config["source"], file_pattern)
-    for file_path in glob.glob(pattern):
-        file_name = os.path.splitext(os.path.basename(file_path))[0]
-        logging.info(f"Processing file: {file_name}")
+    if config["isolate"]:
+        process_files_isolated(config, args, tag, file_pattern, prompt)
+        return
 
-        # Replace FIND_STR with REPLACE_STR in the output file name
-        output_file_name = file_name.replace(config["find"], config["replace"])
-        output_file = os.path.join(config["destination"], f"{output_file_name}.txt")
-
-        # Construct the command to be invoked (without -f)
-        command = [
-            "python",
-            "ewardea.py",
-            "-p", prompt_file  # Add the -p switch for prompt_file
-        ]
-
-        # Include optional parameters in the command
-        if args.url:
-            command.extend(["-u", args.url])
-        if args.bearer:
-            command.extend(["-b", args.bearer])
-        if args.config:
-            command.extend(["-c", args.config])
-        if args.section:
-            command.extend(["-n", args.section])
-
-        # Add the positional argument: <tag>,<file_name>
-        command.append(f"{tag},{file_path}")
-
-        # Add the positional argument: <tag>,<file_name>
-        if config["tag_file"]:
-            command.append(f"{config['tag_file']}")
-
-        logging.info(f"Command to execute: {command}")
-        # Execute the command and redirect output to the output file
-        try:
-            with open(output_file, "w", encoding="utf-8") as output:
-                subprocess.run(command, stdout=output, stderr=subprocess.PIPE, check=True)
-            logging.info(f"Output written to: {output_file}")
-        except subprocess.CalledProcessError as e:
-            logging.error(f"Error processing {file_path}: {e.stderr.decode().strip()}")
+    # Reuse one session, and its open connections, for all files
+    headers = ewardea.prepare_headers(config["bearer_token"])
+    session = ewardea.create_session(headers, pool_maxsize=config["workers"])
 
-def run(args):
-    try:
+    # Send the files matching the pattern in the source directory
+    with ThreadPoolExecutor(max_workers=config["workers"]) as executor:
+        futures = {}
+        for file_path, output_file in iter_output_files(config, file_pattern):
+            # The matched file follows the tag/file tuples from the configuration
+            tag_file_tuples = config["tag_file_tuples"] + [(tag, file_path)]
+
+            future = executor.submit(
+                describe_file, prompt, config["url"], headers, tag_file_tuples, output_file, session
+            )
+            futures[future] = file_path
+
+        # Report each file as soon as its response has been written
+        for future in as_completed(futures):
+            try:
+                output_file = future.result()
+                logging.info(f"Output written to: {output_file}")
+            except Exception as e:
+                logging.error(f"Error processing {futures[future]}: {e}")
+
+def get_configuration(args):
+    """
+    Load and validate the configuration. The result is reused by later calls with the
+    same arguments for as long as the configuration file is unchanged.
+
+    Parameters:
+        args (Namespace): Parsed command-line arguments.
+
+    Returns:
+        dict: A dictionary containing the final configuration values.
+    """
+    mtime_ns = None
+    if args.config and os.path.exists(args.config):
+        mtime_ns = os.stat(args.config).st_mtime_ns
+    key = (mtime_ns, tuple(sorted(
+        (name, tuple(value) if isinstance(value, list) else value) for name, value in vars(args).items()
+    )))
+
+    config = _CONFIG_CACHE.get(key)
+    if config is None:
         # Load configuration
         config = load_configuration(args)
 
         # Validate configuration
         validate_configuration(config)
+        _CONFIG_CACHE[key] = config
+    return config
+
+def run(args):
+    try:
+        # Load and validate configuration
+        config = get_configuration(args)
 
         # Process files
         process_files(config, args)
@@ -162,6 +314,8 @@ def main():
     parser.add_argument("-r", "--replace", help="The string to replace the find string with in the file name.", required=False)
     parser.add_argument("-b", "--bearer", help="The Bearer token for authorization.", required=False)
     parser.add_argument("-u", "--url", help="The URL to which the POST request will be sent.", required=False)
+    parser.add_argument("-w", "--workers", help="The number of files processed at the same time.", type=int, required=False)
+    parser.add_argument("-i", "--isolate", help="Run ewardea.py in a separate process for each file.", action="store_true")
     parser.add_argument("-c", "--config", help="The path to the configuration file.", required=False)
     parser.add_argument("-n", "--section", help="The section name in the configuration file.", required=False)
     parser.add_argument("tag_file", nargs="*", help="Tuples in the format <tag>,<file_name>")
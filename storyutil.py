@@ -0,0 +1,86 @@
+import os
+import re
+import fnmatch
+import logging
+from functools import lru_cache
+
+# Helpers shared by the scripts. configparser is imported where it is used, so that
+# scripts importing this module for match_files do not pay for loading it
+
+@lru_cache(maxsize=32)
+def _parse_config(path, mtime_ns):
+    """
+    Parse a configuration file, caching the result by path and modification time.
+    A changed file has a new mtime_ns and is therefore parsed again.
+
+    Parameters:
+        path (str): The absolute path to the configuration file.
+        mtime_ns (int): The modification time of the file, or None if it does not exist.
+
+    Returns:
+        ConfigParser: The parsed configuration, shared between callers and not to be modified.
+    """
+    import configparser
+
+    config = configparser.ConfigParser()
+    config.read(path)
+    return config
+
+def load_config_parser(path):
+    """
+    Parse a configuration file, or reuse the result of an earlier call if the file is unchanged.
+
+    Parameters:
+        path (str): The path to the configuration file.
+
+    Returns:
+        ConfigParser: The parsed configuration, shared between callers and not to be modified.
+    """
+    path = os.path.abspath(path)
+    mtime_ns = os.stat(path).st_mtime_ns if os.path.exists(path) else None
+    return _parse_config(path, mtime_ns)
+
+def match_files(directory, pattern):
+    """
+    Yield the paths of the files in directory whose name matches pattern.
+    The directory is scanned once with os.scandir instead of being globbed.
+
+    Like glob, names starting with '.' only match a pattern that starts with '.'.
+    The pattern may start with a directory relative to directory, but only its
+    last part may contain wildcards.
+
+    Parameters:
+        directory (str): The directory to scan.
+        pattern (str): The shell-style pattern the file names must match.
+
+    Yields:
+        str: The path of the next matching entry.
+
+    Raises:
+        ValueError: If the directory part of pattern contains wildcards.
+    """
+    # Look for the files in the directory named by the pattern, if any
+    sub_directory, pattern = os.path.split(pattern)
+    if any(ch in sub_directory for ch in "*?["):
+        raise ValueError(f"Wildcards are only supported in the file name of a pattern: '{os.path.join(sub_directory, pattern)}'")
+    directory = os.path.join(directory, sub_directory)
+
+    # A pattern without wildcards names a single file, look it up instead of listing the directory
+    if not any(ch in pattern for ch in "*?["):
+        file_path = os.path.join(directory, pattern)
+        if os.path.isfile(file_path):
+            yield file_path
+        return
+
+    # Match names the way glob does, which ignores case on Windows and skips hidden files
+    regex = re.compile(fnmatch.translate(os.path.normcase(pattern)))
+    match_hidden = pattern.startswith('.')
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.name.startswith('.') and not match_hidden:
+                    continue
+                if regex.match(os.path.normcase(entry.name)) and entry.is_file():
+                    yield entry.path
+    except FileNotFoundError as e:
+        logging.error(f"Directory not found: {directory}. Error: {e}")
@@ -1,10 +1,14 @@
 import os
-import glob
 import re
 import argparse
 import configparser
 import sys
 import logging
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import io
+import tarfile
+import time
+import storyutil
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
@@ -22,7 +26,7 @@ def load_configuration(args):
     config = configparser.ConfigParser()
     if args.config:
         try:
-            config.read(args.config)
+            config = storyutil.load_config_parser(args.config)
             if not config.sections() and not config.defaults():
                 raise ValueError(f"Configuration file '{args.config}' is empty or invalid.")
         except Exception as e:
@@ -32,6 +36,10 @@ def load_configuration(args):
     # Determine the section to read from
     section = args.section if args.section else "DEFAULT"
 
+    # Keys are looked up, and interpolated, one at a time when they are used.
+    # A missing section has no values, its keys are not taken from DEFAULT.
+    sect = config[section] if section in config else {}
+
     # Check if the split pattern exists in the "SPLIT PATTERN" section
     split_pattern = None
     if "SPLIT PATTERN" in config and args.split:
@@ -39,12 +47,13 @@ def load_configuration(args):
 
     # Load and override configuration
     return {
-        "source": args.source or config.get(section, "source", fallback=None),
-        "destination": args.destination or config.get(section, "destination", fallback=None),
-        "pattern": args.pattern or config.get(section, "pattern", fallback=None),
-        "find": args.find or config.get(section, "find", fallback=None),
-        "replace": args.replace or config.get(section, "replace", fallback=None),
-        "split": split_pattern or args.split or config.get(section, "split", fallback=None),
+        "source": args.source or sect.get("source"),
+        "destination": args.destination or sect.get("destination"),
+        "pattern": args.pattern or sect.get("pattern"),
+        "find": args.find or sect.get("find"),
+        "replace": args.replace or sect.get("replace"),
+        "split": split_pattern or args.split or sect.get("split"),
+        "archive": args.archive or config.getboolean(section, "archive", fallback=False),
     }
 
 def validate_configuration(config):
@@ -63,12 +72,148 @@ def validate_configuration(config):
         logging.error(f"Missing required parameters: {', '.join(missing_keys)}")
         raise ValueError(f"Missing required parameters: {', '.join(missing_keys)}")
 
-def process_files(SRC_PATH, DST_PATH, PATTERN, FIND_STR, REPLACE_STR, SPLIT_STR):
+def iter_units(splitter, content):
+    """
+    Yield the stripped, non-empty units of content between the matches of splitter.
+    Units are sliced from content one at a time instead of building a list of all of them.
+
+    Parameters:
+        splitter (re.Pattern): The compiled pattern used to split the content.
+        content (str): The text to split.
+
+    Yields:
+        str: The next unit of content.
+    """
+    start = 0
+    for match in splitter.finditer(content):
+        unit = content[start:match.start()].strip()
+        if unit:
+            yield unit
+        start = match.end()
+    unit = content[start:].strip()
+    if unit:
+        yield unit
+
+def write_unit(path, unit, dir_fd=None):
+    """
+    Write one unit to a file with a single os.write, without the buffered io layer.
+    Newlines are written in the platform's line endings, as text mode does.
+
+    Parameters:
+        path (str): The path of the file to write, relative to dir_fd if it is given.
+        unit (str): The text to write.
+        dir_fd (int): Optional descriptor of the directory the file is created in.
+    """
+    if os.linesep != "\n":
+        unit = unit.replace("\n", os.linesep)
+    data = memoryview(unit.encode('utf-8'))
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0), 0o666, dir_fd=dir_fd)
+    try:
+        while data:
+            data = data[os.write(fd, data):]
+    finally:
+        os.close(fd)
+
+def write_archive(archive_path, base_name, units):
+    """
+    Write units as the members of a single tar archive instead of separate files.
+    Members are named and written like the separate files would be, newlines in the
+    platform's line endings, so extracting the archive gives the same result.
+
+    Parameters:
+        archive_path (str): The path of the tar archive to write.
+        base_name (str): The base name of the members.
+        units (iterable): The units to write.
+
+    Returns:
+        int: The number of members written.
+    """
+    count = 0
+    with tarfile.open(archive_path, 'w') as archive:
+        for count, unit in enumerate(units, start=1):
+            if os.linesep != "\n":
+                unit = unit.replace("\n", os.linesep)
+            data = unit.encode('utf-8')
+            info = tarfile.TarInfo(f"{base_name}_{count:02}.txt")
+            info.size = len(data)
+            info.mtime = int(time.time())
+            archive.addfile(info, io.BytesIO(data))
+    return count
+
+def _process_one(file_path, DST_PATH, FIND_STR, REPLACE_STR, table, splitter, ARCHIVE):
+    """
+    Split one file and write its units to DST_PATH.
+
+    Parameters:
+        file_path (str): The file to split.
+        DST_PATH (str): The destination directory where the output files will be written.
+        FIND_STR (str): The string to find in the file name.
+        REPLACE_STR (str): The string to replace the FIND_STR with in the file name.
+        table (dict): Translation table replacing FIND_STR, or None if it is not a single character.
+        splitter (re.Pattern): The compiled pattern used to split the content.
+        ARCHIVE (bool): Whether to write the units into one tar archive.
+    """
+    file_name = os.path.basename(file_path)
+    base_name = file_name.rpartition('.')[0] or file_name
+
+    # Replace FIND_STR with REPLACE_STR in the base name
+    base_name = base_name.translate(table) if table else base_name.replace(FIND_STR, REPLACE_STR)
+
+    # Read the file content in one read and decode it in one pass
+    try:
+        with open(file_path, 'rb') as file:
+            content = file.read().decode('utf-8')
+    except FileNotFoundError as e:
+        logging.error(f"File not found: {file_path}. Error: {e}")
+        return
+
+    # Translate newlines like text mode, so split patterns only have to match \n
+    if '\r' in content:
+        content = content.replace('\r\n', '\n').replace('\r', '\n')
+
+    # Destination directory with a trailing separator, output names are appended to it
+    dst_prefix = os.path.join(DST_PATH, "")
+
+    # Split the content using the SPLIT_STR pattern and write the units into one archive
+    if ARCHIVE:
+        archive_path = f"{dst_prefix}{base_name}.tar"
+        try:
+            count = write_archive(archive_path, base_name, iter_units(splitter, content))
+            logging.info(f"Written: {archive_path} ({count} units)")
+        except Exception as e:
+            logging.error(f"Error writing to file {archive_path}: {e}")
+        return
+
+    # Open the destination directory once and create the unit files relative to it,
+    # where the platform supports it (not on Windows)
+    dir_fd = None
+    if os.open in os.supports_dir_fd:
+        dir_fd = os.open(DST_PATH, os.O_RDONLY | getattr(os, "O_DIRECTORY", 0))
+
+    # Split the content using the SPLIT_STR pattern and write each unit to a separate file
+    try:
+        for i, unit in enumerate(iter_units(splitter, content), start=1):
+            output_file_name = f"{base_name}_{i:02}.txt"
+            output_file_path = dst_prefix + output_file_name
+            try:
+                if dir_fd is None:
+                    write_unit(output_file_path, unit)
+                else:
+                    write_unit(output_file_name, unit, dir_fd=dir_fd)
+                logging.info(f"Written: {output_file_path}")
+            except Exception as e:
+                logging.error(f"Error writing to file {output_file_path}: {e}")
+    finally:
+        if dir_fd is not None:
+            os.close(dir_fd)
+
+def process_files(SRC_PATH, DST_PATH, PATTERN, FIND_STR, REPLACE_STR, SPLIT_STR, ARCHIVE=False):
     """
     Process all files in the SRC_PATH matching the supplied pattern.
     The content is split using the SPLIT_STR pattern.
     Each split unit is written to a separate file in DST_PATH with the naming convention:
     [REPLACE_STR]_[original_number]_[unit_number].txt.
+    With ARCHIVE the units of each file are written into [REPLACE_STR]_[original_number].tar instead.
 
     Parameters:
         SRC_PATH (str): The source directory containing the files to process.
@@ -77,40 +222,42 @@ def process_files(SRC_PATH, DST_PATH, PATTERN, FIND_STR, REPLACE_STR, SPLIT_STR)
         FIND_STR (str): The string to find in the file name.
         REPLACE_STR (str): The string to replace the FIND_STR with in the file name.
         SPLIT_STR (str): The regex pattern used to split the content.
+        ARCHIVE (bool): Whether to write the units of each file into one tar archive.
     """
     # Ensure the destination directory exists
     os.makedirs(DST_PATH, exist_ok=True)
 
-    # Find all files matching the pattern
-    pattern = os.path.join(SRC_PATH, PATTERN)
-    for file_path in glob.glob(pattern):
-        file_name = os.path.basename(file_path)
-        base_name = os.path.splitext(file_name)[0]
-        
-        # Replace FIND_STR with REPLACE_STR in the base name
-        base_name = base_name.replace(FIND_STR, REPLACE_STR)
-        
-        # Read the file content
-        try:
-            with open(file_path, 'r', encoding='utf-8') as file:
-                content = file.read()
-        except FileNotFoundError as e:
-            logging.error(f"File not found: {file_path}. Error: {e}")
-            continue
-
-        # Split the content using the SPLIT_STR pattern
-        units = [p.strip() for p in re.split(SPLIT_STR, content) if p.strip()]
-        
-        # Write each unit to a separate file
-        for i, unit in enumerate(units, start=1):
-            output_file_name = f"{base_name}_{i:02}.txt"
-            output_file_path = os.path.join(DST_PATH, output_file_name)
+    # Compile the split pattern once for all files, before any output is written
+    try:
+        splitter = re.compile(SPLIT_STR)
+    except re.error as e:
+        logging.error(f"Invalid split pattern '{SPLIT_STR}': {e}")
+        raise ValueError(f"Invalid split pattern '{SPLIT_STR}': {e}")
+
+    # Single character replacements are done with a translation table
+    table = str.maketrans(FIND_STR, REPLACE_STR) if len(FIND_STR) == 1 == len(REPLACE_STR) else None
+
+    file_paths = list(storyutil.match_files(SRC_PATH, PATTERN))
+    if not file_paths:
+        return
+
+    # No more workers than files, and no more than one per CPU. Windows does not
+    # support more than 61 worker processes.
+    max_workers = min(len(file_paths), os.cpu_count() or 1)
+    if sys.platform == "win32":
+        max_workers = min(max_workers, 61)
+
+    # Split the files in parallel, the output files of each file are distinct
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(_process_one, file_path, DST_PATH, FIND_STR, REPLACE_STR, table, splitter, ARCHIVE): file_path
+            for file_path in file_paths
+        }
+        for future in as_completed(futures):
             try:
-                with open(output_file_path, 'w', encoding='utf-8') as output_file:
-                    output_file.write(unit)
-                logging.info(f"Written: {output_file_path}")
+                future.result()
             except Exception as e:
-                logging.error(f"Error writing to file {output_file_path}: {e}")
+                logging.error(f"Error processing {futures[future]}: {e}")
 
 def main():
     # Set up argument parsing
@@ -121,6 +268,7 @@ def main():
     parser.add_argument("-f", "--find", help="The string to find in the file name.", required=False)
     parser.add_argument("-r", "--replace", help="The string to replace the find string with in the file name.", required=False)
     parser.add_argument("-l", "--split", help="The regex pattern used to split the content.", required=False)
+    parser.add_argument("-a", "--archive", help="Write the units of each file into one tar archive.", action="store_true")
     parser.add_argument("-c", "--config", help="The path to the configuration file.", required=False)
     parser.add_argument("-n", "--section", help="The section name in the configuration file.", required=False)
 
@@ -142,6 +290,7 @@ def main():
             config["find"],
             config["replace"],
             config["split"],
+            config["archive"],
         )
     except ValueError as e:
         logging.error(f"Configuration Error: {e}")